@@ -1,87 +1,190 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import ast
-from geopy.distance import geodesic
+import orjson
+from pathlib import Path
 import plotly.express as px
 import plotly.graph_objects as go
+import pydeck as pdk
+from itertools import product
+from math import asin, cos, sin, sqrt
+from numba import njit
+from gage_summaries import SUMMARY_COLUMNS, add_gauge_summaries
 
-def load_gage_data():
-    """Load and parse the gage claims CSV data"""
-    try:
-        df = pd.read_csv("data/gage_claims_50km.csv")
+EARTH_RADIUS_KM = 6371.0
+GRID_CELL_DEG = 0.45  # ~50 km of latitude per grid cell
+DECK_MAP_MIN_GAUGES = 2000  # above this, draw the map with deck.gl instead of Plotly
+GAGE_CLAIMS_PARQUET = Path("data/gage_claims_50km.parquet")
+GAGE_CLAIMS_CSV = Path("data/gage_claims_50km.csv")
+LIST_COLUMNS = ['longitude', 'latitude', 'dates', 'num_claims']
+
+def parse_list(cell):
+    """Parse a stringified Python list (e.g. "['2010-05-01']") from the CSV"""
+    return orjson.loads(cell.replace("'", '"'))
+
+@st.cache_data(show_spinner=False)
+def read_gage_data():
+    """Read the gage claims data (cached across reruns)"""
+    if GAGE_CLAIMS_PARQUET.exists():
+        # Parquet keeps the list columns native, so there is nothing to parse
+        df = pd.read_parquet(GAGE_CLAIMS_PARQUET)
+    else:
+        df = pd.read_csv(GAGE_CLAIMS_CSV)
         
         # Parse the string arrays into actual lists
-        df['longitude'] = df['longitude'].apply(ast.literal_eval)
-        df['latitude'] = df['latitude'].apply(ast.literal_eval)
-        df['dates'] = df['dates'].apply(ast.literal_eval)
-        df['num_claims'] = df['num_claims'].apply(ast.literal_eval)
-        
-        # Calculate center coordinates for each gauge
-        df['center_lon'] = df['longitude'].apply(lambda x: np.mean(x) if x else np.nan)
-        df['center_lat'] = df['latitude'].apply(lambda x: np.mean(x) if x else np.nan)
-        
-        # Calculate total claims per gauge
-        df['total_claims'] = df['num_claims'].apply(lambda x: sum(x) if x else 0)
-        
-        # Calculate number of flood events per gauge
-        df['num_events'] = df['dates'].apply(lambda x: len(x) if x else 0)
-        
-        return df
+        for col in LIST_COLUMNS:
+            df[col] = df[col].map(parse_list)
+    
+    # gage_claims_50km.py writes the per-gauge summaries; derive them for older files
+    if not set(SUMMARY_COLUMNS).issubset(df.columns):
+        df = add_gauge_summaries(df)
+    
+    # Shrink the per-gauge columns: float32 keeps coordinates to ~1 m and the
+    # counts fit int32 (narrower ints would wrap in later arithmetic like size + 5).
+    # The search grid takes its own float64 copy
+    df = df.astype({'center_lon': 'float32', 'center_lat': 'float32',
+                    'total_claims': 'int32', 'num_events': 'int32'})
+    
+    return df
+
+def load_gage_data():
+    """Load the gage claims data, reporting errors in the app"""
+    # Errors are raised out of the cached reader so a failed load is not cached
+    try:
+        return read_gage_data()
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return None
 
-def find_closest_gauges(df, target_lat, target_lon, max_distance_km=50):
-    """Find gauges within specified distance of target coordinates"""
-    if df is None or df.empty:
-        return pd.DataFrame()
+# Serial on purpose: after the grid prefilter only a few hundred candidates
+# remain, and Streamlit calls this from one thread per session, which numba's
+# fallback workqueue threading layer does not support
+@njit(fastmath=True, cache=True)
+def haversine_km(lat, lon, target_lat, target_lon):
+    """Great-circle distance in km from each (lat, lon) to the target"""
+    deg = np.pi / 180.0
+    cos_target = cos(target_lat * deg)
+    out = np.empty(lat.size, np.float64)
+    for i in range(lat.size):
+        dlat = (lat[i] - target_lat) * deg
+        dlon = (lon[i] - target_lon) * deg
+        a = sin(dlat * 0.5) ** 2 + cos(lat[i] * deg) * cos_target * sin(dlon * 0.5) ** 2
+        out[i] = 2.0 * EARTH_RADIUS_KM * asin(sqrt(min(a, 1.0)))
+    return out
+
+@st.cache_resource(show_spinner=False)
+def build_gauge_grid(latlon_bytes, n):
+    """
+    Bucket the gauge center coordinates into a uniform lat/lon grid
     
-    # Remove rows with missing center coordinates
-    df_clean = df.dropna(subset=['center_lat', 'center_lon'])
+    The (n, 2) float64 lat/lon array is passed as raw bytes so Streamlit
+    hashes a flat buffer for the cache key instead of a whole DataFrame.
+    Cells are GRID_CELL_DEG tall and roughly as wide in km at the mean
+    latitude; each cell maps to the DataFrame row positions of its gauges.
+    Gauges without center coordinates are left out of every cell.
+    """
+    coords = np.frombuffer(latlon_bytes, dtype=np.float64).reshape(n, 2)
+    lat, lon = np.ascontiguousarray(coords[:, 0]), np.ascontiguousarray(coords[:, 1])
+    lon_cell_deg = GRID_CELL_DEG / np.cos(np.radians(np.nanmean(lat)))
     
-    if df_clean.empty:
-        return pd.DataFrame()
+    located = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lon))
+    rows = np.floor(lat[located] / GRID_CELL_DEG).astype(np.int32)
+    cols = np.floor(lon[located] / lon_cell_deg).astype(np.int32)
+    cells = {key: located[idx] for key, idx in
+             pd.DataFrame({'row': rows, 'col': cols}).groupby(['row', 'col']).indices.items()}
     
-    # Calculate distances
-    distances = []
-    for _, row in df_clean.iterrows():
-        try:
-            distance = geodesic(
-                (target_lat, target_lon), 
-                (row['center_lat'], row['center_lon'])
-            ).kilometers
-            distances.append(distance)
-        except:
-            distances.append(np.inf)
+    return {'lat': lat, 'lon': lon, 'lon_cell_deg': lon_cell_deg, 'cells': cells}
+
+def query_gauge_grid(grid, target_lat, target_lon, max_distance_km):
+    """Return row positions and distances (km) of gauges within the radius"""
+    # Latitude/longitude reach of the search circle, in degrees
+    angle = max_distance_km / EARTH_RADIUS_KM
+    lat_reach = np.degrees(angle)
+    ratio = np.sin(angle) / np.cos(np.radians(target_lat))
+    lon_reach = np.degrees(np.arcsin(ratio)) if ratio < 1 else 180.0
     
-    df_clean = df_clean.copy()
-    df_clean['distance_km'] = distances
+    # Gather every cell the circle's bounding box touches
+    row_range = range(int(np.floor((target_lat - lat_reach) / GRID_CELL_DEG)),
+                      int(np.floor((target_lat + lat_reach) / GRID_CELL_DEG)) + 1)
+    col_range = range(int(np.floor((target_lon - lon_reach) / grid['lon_cell_deg'])),
+                      int(np.floor((target_lon + lon_reach) / grid['lon_cell_deg'])) + 1)
+    buckets = [grid['cells'][key] for key in product(row_range, col_range) if key in grid['cells']]
     
-    # Filter by distance and sort
-    nearby_gauges = df_clean[df_clean['distance_km'] <= max_distance_km].copy()
-    nearby_gauges = nearby_gauges.sort_values('distance_km')
+    if not buckets:
+        return np.empty(0, dtype=np.intp), np.empty(0)
     
-    return nearby_gauges
+    candidates = np.concatenate(buckets)
+    distances = haversine_km(grid['lat'][candidates], grid['lon'][candidates],
+                             target_lat, target_lon)
+    within = distances <= max_distance_km
+    return candidates[within], distances[within]
+
+def find_closest_gauges(df, grid, target_lat, target_lon, max_distance_km=50):
+    """Find gauges within specified distance of target coordinates"""
+    if df is None or df.empty:
+        return pd.DataFrame()
+    
+    # The grid indexes rows of df directly (gauges without centers are never
+    # returned), so only the matching rows are copied, in distance order
+    positions, distances = query_gauge_grid(grid, target_lat, target_lon, max_distance_km)
+    order = np.argsort(distances)
+    
+    return df.iloc[positions[order]].assign(distance_km=distances[order])
 
 def create_claims_timeline(df):
     """Create a timeline of claims for visualization"""
-    all_events = []
+    timeline = df[['gauge_id', 'dates', 'num_claims', 'discharge']].copy()
+    timeline['distance_km'] = df['distance_km'] if 'distance_km' in df.columns else 0
+    
+    # One row per (gauge, event); gauges without events explode to NaN
+    timeline = timeline.explode(['dates', 'num_claims']).dropna(subset=['dates'])
+    
+    if timeline.empty:
+        return pd.DataFrame()
+    
+    # Parquet stores the dates as datetime64 already; CSV dates are ISO strings
+    timeline['date'] = pd.to_datetime(timeline['dates'], format='%Y-%m-%d', cache=True, errors='coerce')
+    timeline['claims'] = timeline['num_claims'].astype('int64')
+    return timeline[['gauge_id', 'date', 'claims', 'discharge', 'distance_km']].reset_index(drop=True)
+
+def create_deck_map(nearby_gauges, target_lat, target_lon):
+    """Create a WebGL (deck.gl) map of the gauges for large result sets"""
+    data = nearby_gauges[['gauge_id', 'center_lon', 'center_lat', 'total_claims',
+                          'discharge', 'distance_km']].copy()
+    data['radius'] = (data['total_claims'].astype('int64') + 5) * 100
+    
+    # Color by discharge along the Viridis end points, as in the Plotly map;
+    # gauges without a discharge get the low end instead of a NaN color
+    discharge = data['discharge'].to_numpy(dtype=np.float64)
+    known = np.isfinite(discharge)
+    t = np.zeros(len(discharge))
+    if known.any():
+        low, high = discharge[known].min(), discharge[known].max()
+        t[known] = (discharge[known] - low) / ((high - low) or 1.0)
+    data['color'] = np.column_stack([68 + 185 * t, 1 + 230 * t, 84 - 47 * t]).astype(int).tolist()
     
-    for _, row in df.iterrows():
-        if row['dates'] and row['num_claims']:
-            for date, claims in zip(row['dates'], row['num_claims']):
-                all_events.append({
-                    'gauge_id': row['gauge_id'],
-                    'date': pd.to_datetime(date),
-                    'claims': claims,
-                    'discharge': row['discharge'],
-                    'distance_km': row.get('distance_km', 0)
-                })
+    gauges = pdk.Layer(
+        'ScatterplotLayer',
+        data=data,
+        get_position='[center_lon, center_lat]',
+        get_radius='radius',
+        get_fill_color='color',
+        radius_min_pixels=2,
+        pickable=True
+    )
+    target = pdk.Layer(
+        'ScatterplotLayer',
+        data=pd.DataFrame({'lon': [target_lon], 'lat': [target_lat]}),
+        get_position='[lon, lat]',
+        get_fill_color=[255, 0, 0],
+        radius_min_pixels=8
+    )
     
-    if all_events:
-        return pd.DataFrame(all_events)
-    return pd.DataFrame()
+    return pdk.Deck(
+        layers=[gauges, target],
+        initial_view_state=pdk.ViewState(latitude=target_lat, longitude=target_lon, zoom=8),
+        tooltip={'text': 'Gauge {gauge_id}\nClaims: {total_claims}\nDistance: {distance_km} km'}
+    )
 
 def main():
     st.set_page_config(
@@ -103,6 +206,11 @@ def main():
     
     st.success(f"Loaded {len(df)} gauges with flood data")
     
+    # Cached across reruns and sessions, so this is only built once. The grid
+    # keeps a float64 copy of the (float32) centers for the distance kernel
+    coords = df[['center_lat', 'center_lon']].to_numpy(dtype=np.float64)
+    grid = build_gauge_grid(coords.tobytes(), len(coords))
+    
     # Sidebar for input
     st.sidebar.header("📍 Location Input")
     
@@ -140,7 +248,7 @@ def main():
     # Search button
     if st.sidebar.button("🔍 Find Closest Gauges", type="primary"):
         with st.spinner("Searching for nearby gauges..."):
-            nearby_gauges = find_closest_gauges(df, target_lat, target_lon, max_distance)
+            nearby_gauges = find_closest_gauges(df, grid, target_lat, target_lon, max_distance)
             
             if nearby_gauges.empty:
                 st.warning(f"No gauges found within {max_distance} km of the specified location.")
@@ -239,49 +347,54 @@ def main():
         if len(nearby_gauges) > 0:
             st.subheader("🗺️ Map View")
             
-            # Create map
-            fig = go.Figure()
-            
-            # Add target location
-            fig.add_trace(go.Scattermapbox(
-                lat=[target_lat],
-                lon=[target_lon],
-                mode='markers',
-                marker=dict(size=15, color='red', symbol='star'),
-                name='Target Location',
-                text=['Your Location'],
-                hovertemplate='<b>Target Location</b><br>Lat: %{lat:.4f}<br>Lon: %{lon:.4f}<extra></extra>'
-            ))
-            
-            # Add gauge locations
-            fig.add_trace(go.Scattermapbox(
-                lat=nearby_gauges['center_lat'],
-                lon=nearby_gauges['center_lon'],
-                mode='markers',
-                marker=dict(
-                    size=nearby_gauges['total_claims'] + 5,
-                    color=nearby_gauges['discharge'],
-                    colorscale='Viridis',
-                    showscale=True,
-                    colorbar=dict(title="Discharge (cfs)")
-                ),
-                name='Gauges',
-                text=nearby_gauges['gauge_id'],
-                hovertemplate='<b>Gauge %{text}</b><br>Claims: %{marker.size}<br>Distance: %{customdata:.1f} km<extra></extra>',
-                customdata=nearby_gauges['distance_km']
-            ))
-            
-            fig.update_layout(
-                mapbox=dict(
-                    style="open-street-map",
-                    center=dict(lat=target_lat, lon=target_lon),
-                    zoom=8
-                ),
-                height=500,
-                margin=dict(r=0, t=0, l=0, b=0)
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
+            if len(nearby_gauges) > DECK_MAP_MIN_GAUGES:
+                # Plotly ships every marker to the browser as JSON; deck.gl
+                # draws large gauge sets on the GPU instead
+                st.pydeck_chart(create_deck_map(nearby_gauges, target_lat, target_lon))
+            else:
+                # Create map
+                fig = go.Figure()
+                
+                # Add target location
+                fig.add_trace(go.Scattermapbox(
+                    lat=[target_lat],
+                    lon=[target_lon],
+                    mode='markers',
+                    marker=dict(size=15, color='red', symbol='star'),
+                    name='Target Location',
+                    text=['Your Location'],
+                    hovertemplate='<b>Target Location</b><br>Lat: %{lat:.4f}<br>Lon: %{lon:.4f}<extra></extra>'
+                ))
+                
+                # Add gauge locations
+                fig.add_trace(go.Scattermapbox(
+                    lat=nearby_gauges['center_lat'],
+                    lon=nearby_gauges['center_lon'],
+                    mode='markers',
+                    marker=dict(
+                        size=nearby_gauges['total_claims'] + 5,
+                        color=nearby_gauges['discharge'],
+                        colorscale='Viridis',
+                        showscale=True,
+                        colorbar=dict(title="Discharge (cfs)")
+                    ),
+                    name='Gauges',
+                    text=nearby_gauges['gauge_id'],
+                    hovertemplate='<b>Gauge %{text}</b><br>Claims: %{marker.size}<br>Distance: %{customdata:.1f} km<extra></extra>',
+                    customdata=nearby_gauges['distance_km']
+                ))
+                
+                fig.update_layout(
+                    mapbox=dict(
+                        style="open-street-map",
+                        center=dict(lat=target_lat, lon=target_lon),
+                        zoom=8
+                    ),
+                    height=500,
+                    margin=dict(r=0, t=0, l=0, b=0)
+                )
+                
+                st.plotly_chart(fig, use_container_width=True)
     
     # Footer
     st.markdown("---")
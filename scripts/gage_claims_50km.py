@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from sklearn.neighbors import BallTree
+from gage_summaries import add_gauge_summaries
+
+EARTH_RADIUS_KM = 6371.0
+RADIUS_KM = 50
+
+def load_claims(csv_path='data/Outputs/goodClaims.csv'):
+    """
+    Load the claim locations and parsed dates of loss
+
+    The cleaned columns are cached as a Parquet file next to the CSV, which
+    keeps dateOfLoss as datetime64; the cache is rebuilt whenever the CSV
+    is newer.
+    """
+    csv_path = Path(csv_path)
+    parquet_path = csv_path.with_suffix('.parquet')
+    if parquet_path.exists() and (not csv_path.exists()
+                                  or parquet_path.stat().st_mtime >= csv_path.stat().st_mtime):
+        return pd.read_parquet(parquet_path)
+
+    claims = pd.read_csv(csv_path, low_memory=False)
+    claims.columns = claims.columns.str.strip()
+    claims = claims[['latitude', 'longitude', 'dateOfLoss']]
+    claims['dateOfLoss'] = pd.to_datetime(claims['dateOfLoss'], errors='coerce')
+    claims = claims.dropna().reset_index(drop=True)
+    claims.to_parquet(parquet_path, index=False)
+    return claims
+
+def match_claims_to_gages(gages, claims, radius_km=RADIUS_KM):
+    """
+    Count claims per date of loss within radius_km of each gage
+
+    Parameters:
+    - gages: DataFrame with per-gage 'latitude' and 'longitude' point lists
+    - claims: DataFrame with 'latitude', 'longitude' and 'dateOfLoss'
+    - radius_km: Search radius around every gage point
+
+    Returns:
+    - (dates, num_claims): per-gage lists of dates (Timestamps) and claim counts
+    """
+    tree = BallTree(np.radians(claims[['latitude', 'longitude']].to_numpy()), metric='haversine')
+
+    # Flatten every gage's points into one (M, 2) probe array so the tree is
+    # queried once; each probe remembers which gage it came from
+    gage_of_probe = np.repeat(np.arange(len(gages)), gages['latitude'].map(len).to_numpy())
+    probes = np.radians(np.column_stack([
+        np.concatenate(gages['latitude'].to_list()),
+        np.concatenate(gages['longitude'].to_list())
+    ]))
+    hits = tree.query_radius(probes, r=radius_km / EARTH_RADIUS_KM)
+
+    # One row per (gage, claim) hit; a claim near several points of the same
+    # gage only counts once
+    hit_counts = np.fromiter((len(h) for h in hits), dtype=np.intp, count=len(hits))
+    claim_of_hit = np.concatenate(hits) if len(hits) else np.empty(0, dtype=np.intp)
+    pairs = pd.DataFrame({
+        'gage': np.repeat(gage_of_probe, hit_counts),
+        'claim': claim_of_hit
+    }).drop_duplicates()
+
+    # A single hash aggregation over all hits gives the per-gage date counts
+    pairs['date'] = claims['dateOfLoss'].to_numpy()[pairs['claim'].to_numpy()]
+    counts = pairs.groupby(['gage', 'date']).size().reset_index(name='claims')
+    per_gage = counts.groupby('gage').agg(list)
+
+    dates = [per_gage['date'].get(g, []) for g in range(len(gages))]
+    num_claims = [per_gage['claims'].get(g, []) for g in range(len(gages))]
+
+    return dates, num_claims
+
+def main():
+    # Written by gage_events_summery.py; the coordinate lists are stored natively
+    gages = pd.read_parquet('data/Outputs/gage_events_summary.parquet')
+
+    claims = load_claims()
+    print(f'Matching {len(claims)} claims to {len(gages)} gages within {RADIUS_KM} km')
+
+    dates, num_claims = match_claims_to_gages(gages, claims)
+
+    # Save to Parquet so the list columns (dates as datetime64) are read back without parsing
+    df = gages[['gauge_id', 'longitude', 'latitude', 'discharge', 'sqmi']].copy()
+    df['dates'] = dates
+    df['num_claims'] = num_claims
+
+    # Pre-compute the per-gage summaries the app displays so it only reads them
+    df = add_gauge_summaries(df)
+    df.to_parquet('data/gage_claims_50km.parquet', index=False)
+    print('Gage claims file generated: data/gage_claims_50km.parquet')
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,46 @@
 import os
+import json
 import scipy.io
 import numpy as np
 import pandas as pd
 
+def _unwrap(value):
+    """Return the first element of a squeezed MATLAB field, or None when empty"""
+    if np.size(value) == 0:
+        return None
+    return np.ravel(value)[0]
+
 def extract_gage_info(mat_path, var_name):
-    mat = scipy.io.loadmat(mat_path)
+    # squeeze_me drops MATLAB's (1, 1) wrappers, so scalars load as scalars
+    mat = scipy.io.loadmat(mat_path, squeeze_me=True)
     gages = mat.get(var_name)
     events = []
     if gages is not None:
-        for entry in gages:
-            # Each entry is a tuple with known structure
-            tup = entry[0]
+        gages = np.atleast_1d(gages)
+        # Fields are addressed by position; pull each one out as a whole column
+        fields = gages.dtype.names
+        coords = gages[fields[1]]
+        gauge_ids = gages[fields[4]]
+        discharges = gages[fields[5]]
+        sqmis = gages[fields[6]] if len(fields) > 6 else [None] * len(gages)
+        for xy, gauge_id, discharge, sqmi in zip(coords, gauge_ids, discharges, sqmis):
             # Extract gauge id, coordinates, discharge, sqmi
-            try:
-                gauge_id = tup[4][0] if len(tup[4]) > 0 else None
-                lon = tup[1][:,0].tolist() if tup[1].ndim == 2 else tup[1].tolist()
-                lat = tup[1][:,1].tolist() if tup[1].ndim == 2 else tup[1].tolist()
-                discharge = tup[5][0][0] if tup[5].size > 0 else None
-                sqmi = tup[6][0][0] if len(tup) > 6 and tup[6].size > 0 else None
-                events.append({
-                    'gauge_id': gauge_id,
-                    'longitude': lon,
-                    'latitude': lat,
-                    'discharge': discharge,
-                    'sqmi': sqmi
-                })
-            except Exception as e:
+            xy = np.asarray(xy)
+            # Gages without coordinates have nothing to match claims against
+            if xy.size == 0:
                 continue
+            # squeeze_me turns a single (1, 2) point into shape (2,); restore the rows
+            if xy.ndim < 2:
+                xy = xy.reshape(-1, 2)
+            lon = xy[:, 0].tolist()
+            lat = xy[:, 1].tolist()
+            events.append({
+                'gauge_id': _unwrap(gauge_id),
+                'longitude': lon,
+                'latitude': lat,
+                'discharge': _unwrap(discharge),
+                'sqmi': _unwrap(sqmi)
+            })
     return events
 
 def main():
@@ -39,8 +53,13 @@ def main():
     for mat_path, var_name in gage_files:
         events = extract_gage_info(mat_path, var_name)
         all_events.extend(events)
-    # Save to CSV
     df = pd.DataFrame(all_events)
+    # Save to Parquet for the pipeline; the coordinate lists are stored natively
+    df.to_parquet('data/Outputs/gage_events_summary.parquet', index=False)
+    print('Summary file generated: data/Outputs/gage_events_summary.parquet')
+    # Also save a CSV for inspection and plot_csv.py, writing coordinate lists as JSON
+    df['longitude'] = df['longitude'].map(json.dumps)
+    df['latitude'] = df['latitude'].map(json.dumps)
     df.to_csv('data/Outputs/gage_events_summary.csv', index=False)
     print('Summary file generated: data/Outputs/gage_events_summary.csv')
 
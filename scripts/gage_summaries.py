@@ -0,0 +1,17 @@
+SUMMARY_COLUMNS = ['center_lon', 'center_lat', 'total_claims', 'num_events']
+
+def add_gauge_summaries(df):
+    """Add center coordinates, total claims and event counts per gauge"""
+    # Calculate center coordinates for each gauge. Exploding the list
+    # columns gives one row per element keyed by the gauge's index, so each
+    # reduction is a single groupby (empty lists explode to NaN)
+    df['center_lon'] = df['longitude'].explode().astype('float64').groupby(level=0).mean()
+    df['center_lat'] = df['latitude'].explode().astype('float64').groupby(level=0).mean()
+
+    # Calculate total claims per gauge
+    df['total_claims'] = df['num_claims'].explode().astype('float64').groupby(level=0).sum().astype('int64')
+
+    # Calculate number of flood events per gauge
+    df['num_events'] = df['dates'].explode().groupby(level=0).count()
+
+    return df
@@ -36,16 +36,17 @@ def filter_claims_by_location(df, target_lat, target_lon, radius_degrees=0.1):
     # Remove rows with missing coordinates
     df_clean = df.dropna(subset=['latitude', 'longitude'])
     
-    # Calculate distance from target point
-    lat_diff = df_clean['latitude'] - target_lat
-    lon_diff = df_clean['longitude'] - target_lon
-    distance = np.sqrt(lat_diff**2 + lon_diff**2)
+    # Calculate squared distance from target point (sqrt is only needed for the matches)
+    lat_diff = df_clean['latitude'].to_numpy() - target_lat
+    lon_diff = df_clean['longitude'].to_numpy() - target_lon
+    dist_sq = lat_diff**2 + lon_diff**2
     
     # Filter by radius
-    filtered_df = df_clean[distance <= radius_degrees].copy()
+    within = dist_sq <= radius_degrees**2
+    filtered_df = df_clean[within].copy()
     
     # Add distance column for reference
-    filtered_df['distance_from_target'] = distance[distance <= radius_degrees]
+    filtered_df['distance_from_target'] = np.sqrt(dist_sq[within])
     
     print(f"Found {len(filtered_df)} claims within {radius_degrees} degrees of ({target_lat}, {target_lon})")
     
@@ -70,11 +71,14 @@ def get_claims_by_exact_location(df, target_lat, target_lon, tolerance=0.001):
     # Remove rows with missing coordinates
     df_clean = df.dropna(subset=['latitude', 'longitude'])
     
-    # Filter for exact location match
-    exact_match = df_clean[
-        (abs(df_clean['latitude'] - target_lat) <= tolerance) & 
-        (abs(df_clean['longitude'] - target_lon) <= tolerance)
-    ].copy()
+    # Filter for exact location match (numexpr fuses the comparisons into one pass)
+    mask = pd.eval(
+        "(abs(lat - target_lat) <= tolerance) & (abs(lon - target_lon) <= tolerance)",
+        local_dict={'lat': df_clean['latitude'].to_numpy(), 'lon': df_clean['longitude'].to_numpy(),
+                    'target_lat': target_lat, 'target_lon': target_lon, 'tolerance': tolerance},
+        engine='numexpr'
+    )
+    exact_match = df_clean[mask].copy()
     
     print(f"Found {len(exact_match)} claims at exact location ({target_lat}, {target_lon})")
     
@@ -98,13 +102,14 @@ def get_claims_by_bounding_box(df, min_lat, max_lat, min_lon, max_lon):
     # Remove rows with missing coordinates
     df_clean = df.dropna(subset=['latitude', 'longitude'])
     
-    # Filter by bounding box
-    bbox_filtered = df_clean[
-        (df_clean['latitude'] >= min_lat) & 
-        (df_clean['latitude'] <= max_lat) &
-        (df_clean['longitude'] >= min_lon) & 
-        (df_clean['longitude'] <= max_lon)
-    ].copy()
+    # Filter by bounding box (numexpr fuses the comparisons into one pass)
+    mask = pd.eval(
+        "(lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)",
+        local_dict={'lat': df_clean['latitude'].to_numpy(), 'lon': df_clean['longitude'].to_numpy(),
+                    'min_lat': min_lat, 'max_lat': max_lat, 'min_lon': min_lon, 'max_lon': max_lon},
+        engine='numexpr'
+    )
+    bbox_filtered = df_clean[mask].copy()
     
     print(f"Found {len(bbox_filtered)} claims within bounding box")
     print(f"Lat: {min_lat} to {max_lat}, Lon: {min_lon} to {max_lon}")
@@ -124,15 +129,24 @@ def analyze_claims_risk(df):
     if df is None or len(df) == 0:
         return {"error": "No data to analyze"}
     
+    # Count the indicator flags and sum the payouts in one pass per column
+    # group instead of slicing the DataFrame once per statistic
+    flag_cols = [col for col in ('causedBy100yr', 'elevatedBuildingIndicator', 'postFIRMConstructionIndicator')
+                 if col in df.columns]
+    flag_counts = dict(zip(flag_cols, (df[flag_cols].to_numpy() == 1).sum(axis=0).tolist()))
+    payout_cols = [col for col in ('amountPaidOnBuildingClaim', 'amountPaidOnContentsClaim')
+                   if col in df.columns]
+    payouts = df[payout_cols].sum()
+    
     analysis = {
         "total_claims": len(df),
-        "claims_caused_by_100yr": len(df[df['causedBy100yr'] == 1]) if 'causedBy100yr' in df.columns else 0,
+        "claims_caused_by_100yr": flag_counts.get('causedBy100yr', 0),
         "unique_flood_zones": df['floodZone'].value_counts().to_dict() if 'floodZone' in df.columns else {},
         "states_represented": df['state'].value_counts().to_dict() if 'state' in df.columns else {},
-        "total_building_payout": df['amountPaidOnBuildingClaim'].sum() if 'amountPaidOnBuildingClaim' in df.columns else 0,
-        "total_contents_payout": df['amountPaidOnContentsClaim'].sum() if 'amountPaidOnContentsClaim' in df.columns else 0,
-        "elevated_buildings": len(df[df['elevatedBuildingIndicator'] == 1]) if 'elevatedBuildingIndicator' in df.columns else 0,
-        "post_firm_construction": len(df[df['postFIRMConstructionIndicator'] == 1]) if 'postFIRMConstructionIndicator' in df.columns else 0
+        "total_building_payout": payouts.get('amountPaidOnBuildingClaim', 0),
+        "total_contents_payout": payouts.get('amountPaidOnContentsClaim', 0),
+        "elevated_buildings": flag_counts.get('elevatedBuildingIndicator', 0),
+        "post_firm_construction": flag_counts.get('postFIRMConstructionIndicator', 0)
     }
     
     return analysis
@@ -0,0 +1,144 @@
+import scipy.io
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from numba import njit, prange
+
+KEPT_GAGES_MAT = "data/Outputs/keptGages.mat"
+KEPT_GAGES_FIELDS = ['SITE_NO', 'SQMI', 'ABS_DIFF', 'BoundingBox', 'X']
+
+BBOX_COLUMNS = ['center_lon', 'center_lat', 'bbox_min_lon', 'bbox_max_lon', 'bbox_min_lat', 'bbox_max_lat']
+
+@njit(parallel=True, cache=True)
+def derive_bbox_columns(bboxes):
+    """Compute the BBOX_COLUMNS from (n, 2, 2) bounding boxes in one parallel pass
+
+    Returns a (6, n) float32 array, one contiguous row per column.
+    """
+    n = bboxes.shape[0]
+    out = np.empty((6, n), dtype=np.float32)
+    for i in prange(n):
+        out[0, i] = (bboxes[i, 0, 0] + bboxes[i, 1, 0]) * 0.5
+        out[1, i] = (bboxes[i, 0, 1] + bboxes[i, 1, 1]) * 0.5
+        out[2, i] = bboxes[i, 0, 0]
+        out[3, i] = bboxes[i, 1, 0]
+        out[4, i] = bboxes[i, 0, 1]
+        out[5, i] = bboxes[i, 1, 1]
+    return out
+
+def _h5_value(f, ref):
+    """Read one referenced MATLAB v7.3 value the way loadmat(squeeze_me=True) returns it"""
+    dataset = f[ref]
+    if dataset.attrs.get('MATLAB_empty', 0):
+        return np.empty(0)
+    # HDF5 stores MATLAB arrays column-major, so transpose back
+    value = dataset[()].T
+    if dataset.attrs.get('MATLAB_class') == b'char':
+        return ''.join(map(chr, value.ravel()))
+    return np.squeeze(value)
+
+def read_struct_columns(mat_file, name='keptGages', fields=KEPT_GAGES_FIELDS):
+    """
+    Read each field of a MATLAB struct array as one object array column
+
+    MATLAB v5/v7 files go through scipy.io.loadmat with squeeze_me=True, which
+    unwraps the (1, 1) wrappers around scalars and strings in the parser;
+    v7.3 (HDF5) files are read with h5py.
+    """
+    try:
+        mat_data = scipy.io.loadmat(mat_file, squeeze_me=True)
+    except NotImplementedError:
+        # loadmat refuses v7.3 files; those are HDF5 with one reference per record and field
+        import h5py
+        with h5py.File(mat_file, 'r') as f:
+            group = f[name]
+            columns = {}
+            for field in fields:
+                refs = group[field][()].ravel()
+                column = np.empty(len(refs), dtype=object)
+                for i, ref in enumerate(refs):
+                    column[i] = _h5_value(f, ref)
+                columns[field] = column
+            return columns
+
+    records = np.atleast_1d(mat_data[name])
+    return {field: records[field] for field in fields}
+
+def extract_gage_data(mat_file=KEPT_GAGES_MAT):
+    """Extract gage data from the keptGages struct array in a .mat file"""
+    # Each struct field comes back as a whole column, so the steps below never
+    # look fields up record by record
+    columns = read_struct_columns(mat_file)
+    site_col = columns['SITE_NO']
+    sqmi_col = columns['SQMI']
+    abs_col = columns['ABS_DIFF']
+    bbox_col = columns['BoundingBox']
+    x_col = columns['X']
+    total = len(site_col)
+
+    print(f"Found {total} records in .mat file")
+
+    # Skip records whose SQMI/ABS_DIFF are empty or whose BoundingBox is not
+    # a full 2x2 box; one mask over the columns instead of a try/except per record
+    valid = (np.fromiter((np.size(v) > 0 for v in sqmi_col), dtype=bool, count=total)
+             & np.fromiter((np.size(v) > 0 for v in abs_col), dtype=bool, count=total)
+             & np.fromiter((np.size(b) == 4 for b in bbox_col), dtype=bool, count=total))
+    index = np.flatnonzero(valid)
+    site_col, sqmi_col, abs_col = site_col[valid], sqmi_col[valid], abs_col[valid]
+    bbox_col, x_col = bbox_col[valid], x_col[valid]
+    n = len(index)
+
+    print(f"Successfully extracted {n} records, {total - n} errors")
+
+    # Extract each field across all records at once instead of building a
+    # dict per record. Arrays are allocated in their final dtypes so the
+    # DataFrame adopts them as-is: float32 is far finer than the plots resolve
+    # and halves the data streamed per draw
+    site_no = np.empty(n, dtype=object)
+    for j, (i, site) in enumerate(zip(index, site_col)):
+        site_no[j] = site if np.size(site) > 0 else f"unknown_{i}"
+    # SQMI/ABS_DIFF can hold more than one value; like the original loader, keep the first
+    sqmi = np.fromiter((np.ravel(v)[0] for v in sqmi_col), dtype=np.float32, count=n)
+    abs_diff = np.fromiter((np.ravel(v)[0] for v in abs_col), dtype=np.float32, count=n)
+    coord_count = np.fromiter((np.size(x) for x in x_col), dtype=np.int32, count=n)
+
+    # Bounding boxes stacked as (n, 2, 2): [[min_lon, min_lat], [max_lon, max_lat]]
+    if n:
+        bboxes = np.stack([np.asarray(b, dtype=np.float64).reshape(2, 2) for b in bbox_col])
+    else:
+        bboxes = np.empty((0, 2, 2))
+    derived = derive_bbox_columns(np.ascontiguousarray(bboxes))
+
+    # Site numbers are dictionary-encoded so nunique() works on integer codes
+    df = pd.DataFrame({
+        'site_no': pd.Categorical(site_no),
+        'sqmi': sqmi,
+        'abs_diff': abs_diff,
+        **dict(zip(BBOX_COLUMNS, derived)),
+        'coord_count': coord_count
+    }, copy=False)
+    if not df.empty:
+        print(f"DataFrame created with {len(df)} rows and columns: {list(df.columns)}")
+    else:
+        print("Warning: No data extracted!")
+
+    return df
+
+def load_gage_data(mat_file=KEPT_GAGES_MAT):
+    """
+    Load gage data from keptGages.mat
+
+    The extracted DataFrame is cached as a Parquet file next to the .mat,
+    which is rebuilt whenever the .mat is newer.
+    """
+    mat_path = Path(mat_file)
+    parquet_path = mat_path.with_suffix('.parquet')
+    if parquet_path.exists() and (not mat_path.exists()
+                                  or parquet_path.stat().st_mtime >= mat_path.stat().st_mtime):
+        print(f"Loading cached gage data from {parquet_path}")
+        return pd.read_parquet(parquet_path)
+
+    df = extract_gage_data(mat_path)
+    if not df.empty:
+        df.to_parquet(parquet_path, index=False)
+    return df
@@ -1,8 +1,14 @@
+import os
 import pandas as pd
 import numpy as np
+import matplotlib
+
+# Figures are only written to files unless SHOW_PLOTS is set, so skip the GUI backend
+SHOW_PLOTS = bool(os.environ.get('SHOW_PLOTS'))
+if not SHOW_PLOTS:
+    matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from pathlib import Path
-import ast
 
 def load_csv_data():
     """Load gage data from CSV file"""
@@ -18,11 +24,10 @@ def load_csv_data():
 
 def parse_coordinates(df):
     """Parse the coordinate strings into separate lat/lon values"""
-    # Parse longitude and latitude from string format
-    df['lon_min'] = df['longitude'].apply(lambda x: ast.literal_eval(x)[0])
-    df['lon_max'] = df['longitude'].apply(lambda x: ast.literal_eval(x)[1])
-    df['lat_min'] = df['latitude'].apply(lambda x: ast.literal_eval(x)[0])
-    df['lat_max'] = df['latitude'].apply(lambda x: ast.literal_eval(x)[1])
+    # Parse the first two values of each "[a, b, ...]" string in one vectorized pass
+    pair = r'\[\s*([^,\]]+),\s*([^,\]]+)'
+    df[['lon_min', 'lon_max']] = df['longitude'].str.extract(pair).astype('float64').to_numpy()
+    df[['lat_min', 'lat_max']] = df['latitude'].str.extract(pair).astype('float64').to_numpy()
     
     # Calculate center coordinates
     df['center_lon'] = (df['lon_min'] + df['lon_max']) / 2
@@ -42,13 +47,15 @@ def create_gage_map(df):
     fig, ax = plt.subplots(figsize=(16, 12))
     
     # Plot gage locations with size based on drainage area and color based on discharge
-    scatter = ax.scatter(df['center_lon'], df['center_lat'], 
-                        s=df['sqmi'] * 0.5,        # Size based on drainage area (sq mi)
-                        c=df['discharge'],         # Color based on discharge
+    scatter = ax.scatter(df['center_lon'].values, df['center_lat'].values, 
+                        s=df['sqmi'].values * 0.5,        # Size based on drainage area (sq mi)
+                        c=df['discharge'].values,         # Color based on discharge
                         alpha=0.7, 
                         cmap='viridis',
                         edgecolors='black',
                         linewidth=0.5)
+    # Draw the points as one raster layer; axes and labels stay vector
+    scatter.set_rasterized(True)
     
     # Add colorbar
     cbar = plt.colorbar(scatter, ax=ax, shrink=0.8)
@@ -96,21 +103,23 @@ def create_gage_map(df):
     plt.savefig(output_file, dpi=300, bbox_inches='tight')
     print(f"Map saved to {output_file}")
     
-    plt.show()
+    if SHOW_PLOTS:
+        plt.show()
+    plt.close(fig)
 
 def create_discharge_histogram(df):
     """Create histogram of discharge values"""
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
     
     # Linear scale histogram
-    ax1.hist(df['discharge'], bins=50, alpha=0.7, color='skyblue', edgecolor='black')
+    ax1.hist(df['discharge'].values, bins=50, alpha=0.7, color='skyblue', edgecolor='black')
     ax1.set_xlabel('Discharge (cfs)')
     ax1.set_ylabel('Number of Gages')
     ax1.set_title('Distribution of Discharge Values')
     ax1.grid(True, alpha=0.3)
     
     # Log scale histogram
-    ax2.hist(np.log10(df['discharge']), bins=50, alpha=0.7, color='lightcoral', edgecolor='black')
+    ax2.hist(np.log10(df['discharge'].values), bins=50, alpha=0.7, color='lightcoral', edgecolor='black')
     ax2.set_xlabel('Log10(Discharge)')
     ax2.set_ylabel('Number of Gages')
     ax2.set_title('Distribution of Discharge Values (Log Scale)')
@@ -118,7 +127,9 @@ def create_discharge_histogram(df):
     
     plt.tight_layout()
     plt.savefig('data/Outputs/discharge_distribution.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    if SHOW_PLOTS:
+        plt.show()
+    plt.close(fig)
 
 def main():
     """Main function"""
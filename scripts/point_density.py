@@ -0,0 +1,41 @@
+import numpy as np
+
+# datashader is optional; without it the plots keep drawing individual markers
+try:
+    import datashader as ds
+except ImportError:
+    ds = None
+
+# Below this many points matplotlib markers are still fast enough
+DATASHADER_MIN_POINTS = 100_000
+
+def use_datashader(n_points):
+    """Whether to aggregate n_points with datashader instead of drawing markers"""
+    return ds is not None and n_points >= DATASHADER_MIN_POINTS
+
+def shade_points(ax, df, x, y, value=None, width=1600, height=1200, **imshow_kwargs):
+    """
+    Aggregate points onto a pixel grid with datashader and draw the grid with imshow
+
+    Parameters:
+    - ax: Matplotlib axes to draw on
+    - df: DataFrame holding the point columns
+    - x, y: Column names for the point coordinates
+    - value: Column to average per pixel; None counts points per pixel
+    - width, height: Size of the aggregation grid in pixels
+
+    Returns:
+    - The AxesImage, usable as a colorbar mappable
+    """
+    x_range = (float(df[x].min()), float(df[x].max()))
+    y_range = (float(df[y].min()), float(df[y].max()))
+    canvas = ds.Canvas(plot_width=width, plot_height=height, x_range=x_range, y_range=y_range)
+
+    reduction = ds.count() if value is None else ds.mean(value)
+    grid = canvas.points(df, x, y, reduction).values.astype(np.float64)
+    # Leave empty pixels transparent (mean is already NaN there)
+    if value is None:
+        grid[grid == 0] = np.nan
+
+    return ax.imshow(grid, origin='lower', extent=(*x_range, *y_range),
+                     aspect='auto', interpolation='nearest', **imshow_kwargs)
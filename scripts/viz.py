@@ -1,91 +1,53 @@
-import scipy.io
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
+import matplotlib
+
+# Batch job that only writes PNGs; Agg needs no windowing system
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
+from mat_data_handler import KEPT_GAGES_MAT, load_gage_data
+from point_density import use_datashader, shade_points
+
+# PNGs are saved at screen resolution; --hires switches to print resolution
+DPI = 150
+HIRES_DPI = 300
+
+def compute_summary(df):
+    """
+    Compute the statistics and validity masks shared by all plots in one pass
+
+    Returns:
+    - stats: describe() table for the numeric columns
+    - valid_sqmi_mask: Boolean array of records with a positive drainage area
+    - valid_both_mask: Boolean array of records with both a positive drainage area and ABS_DIFF
+    """
+    stats = df[['sqmi', 'abs_diff', 'center_lon', 'center_lat', 'coord_count']].describe()
+    valid_sqmi_mask = df['sqmi'].values > 0
+    valid_both_mask = valid_sqmi_mask & (df['abs_diff'].values > 0)
+    return stats, valid_sqmi_mask, valid_both_mask
 
-def load_gage_data():
-    """Load and extract gage data from keptGages.mat"""
-    mat_file = "data/Outputs/keptGages.mat"
-    mat_data = scipy.io.loadmat(mat_file)
-    kept_gages = mat_data['keptGages']
-    
-    # Extract data
-    extracted_data = []
-    for i in range(len(kept_gages)):
-        record = kept_gages[i][0]
-        try:
-            # Handle different data structures
-            site_no = record['SITE_NO'][0] if record['SITE_NO'].size > 0 else f"unknown_{i}"
-            
-            # Handle SQMI - could be scalar or array
-            if record['SQMI'].size == 1:
-                sqmi = float(record['SQMI'][0][0]) if record['SQMI'].ndim > 1 else float(record['SQMI'][0])
-            else:
-                sqmi = float(record['SQMI'][0][0])
-            
-            # Handle ABS_DIFF - could be scalar or array
-            if record['ABS_DIFF'].size == 1:
-                abs_diff = float(record['ABS_DIFF'][0][0]) if record['ABS_DIFF'].ndim > 1 else float(record['ABS_DIFF'][0])
-            else:
-                abs_diff = float(record['ABS_DIFF'][0][0])
-            
-            # Get center coordinates from bounding box
-            bbox = record['BoundingBox'][0]
-            center_lon = (bbox[0][0] + bbox[1][0]) / 2
-            center_lat = (bbox[0][1] + bbox[1][1]) / 2
-            
-            # Handle coordinate count
-            coord_count = record['X'][0].size if record['X'].size > 0 else 0
-            
-            extracted_data.append({
-                'site_no': site_no,
-                'sqmi': sqmi,
-                'abs_diff': abs_diff,
-                'center_lon': center_lon,
-                'center_lat': center_lat,
-                'bbox_min_lon': bbox[0][0],
-                'bbox_max_lon': bbox[1][0],
-                'bbox_min_lat': bbox[0][1],
-                'bbox_max_lat': bbox[1][1],
-                'coord_count': coord_count
-            })
-        except Exception as e:
-            print(f"Error extracting record {i}: {e}")
-            # Try to extract at least basic info
-            try:
-                site_no = f"error_{i}"
-                sqmi = 0.0
-                abs_diff = 0.0
-                center_lon = 0.0
-                center_lat = 0.0
-                
-                extracted_data.append({
-                    'site_no': site_no,
-                    'sqmi': sqmi,
-                    'abs_diff': abs_diff,
-                    'center_lon': center_lon,
-                    'center_lat': center_lat,
-                    'bbox_min_lon': 0.0,
-                    'bbox_max_lon': 0.0,
-                    'bbox_min_lat': 0.0,
-                    'bbox_max_lat': 0.0,
-                    'coord_count': 0
-                })
-            except:
-                continue
-    
-    return pd.DataFrame(extracted_data)
+def plot_histogram(ax, values, bins, **bar_kwargs):
+    """Bin values once with np.histogram and draw the counts as bars"""
+    # np.histogram rejects NaN; skip missing values the way ax.hist did
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', **bar_kwargs)
+    return counts, edges
 
-def plot_gage_locations(df):
+def plot_gage_locations(df, stats, dpi=DPI):
     """Plot gage locations on a map"""
-    plt.figure(figsize=(12, 8))
+    fig = plt.figure(figsize=(12, 8))
     
     # Create scatter plot
-    scatter = plt.scatter(df['center_lon'], df['center_lat'], 
-                         c=df['sqmi'], s=df['abs_diff']*10000, 
+    scatter = plt.scatter(df['center_lon'].values, df['center_lat'].values, 
+                         c=df['sqmi'].values, s=df['abs_diff'].values*10000, 
                          alpha=0.6, cmap='viridis')
+    scatter.set_rasterized(True)
     
     plt.colorbar(scatter, label='Drainage Area (sq mi)')
     plt.xlabel('Longitude')
@@ -95,23 +57,23 @@ def plot_gage_locations(df):
     
     # Add some statistics
     plt.figtext(0.02, 0.02, f'Total Gages: {len(df):,}\n'
-                           f'Drainage Area Range: {df["sqmi"].min():.1f} - {df["sqmi"].max():.1f} sq mi\n'
-                           f'ABS_DIFF Range: {df["abs_diff"].min():.6f} - {df["abs_diff"].max():.6f}',
+                           f'Drainage Area Range: {stats.at["min", "sqmi"]:.1f} - {stats.at["max", "sqmi"]:.1f} sq mi\n'
+                           f'ABS_DIFF Range: {stats.at["min", "abs_diff"]:.6f} - {stats.at["max", "abs_diff"]:.6f}',
                 fontsize=10, bbox=dict(boxstyle="round,pad=0.3", facecolor="white", alpha=0.8))
     
     plt.tight_layout()
-    plt.savefig('data/Outputs/gage_locations.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    plt.savefig('data/Outputs/gage_locations.png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
 
-def plot_drainage_area_distribution(df):
+def plot_drainage_area_distribution(df, valid_sqmi_mask, dpi=DPI):
     """Plot distribution of drainage areas"""
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
     
     # Filter out zero values
-    valid_sqmi = df[df['sqmi'] > 0]['sqmi']
+    valid_sqmi = df['sqmi'].values[valid_sqmi_mask]
     
     # Histogram
-    ax1.hist(valid_sqmi, bins=50, alpha=0.7, color='skyblue', edgecolor='bqlack')
+    plot_histogram(ax1, valid_sqmi, 50, alpha=0.7, color='skyblue', edgecolor='black')
     ax1.set_xlabel('Drainage Area (sq mi)')
     ax1.set_ylabel('Number of Gages')
     ax1.set_title(f'Distribution of Drainage Areas\n(Valid records: {len(valid_sqmi):,})')
@@ -119,8 +81,14 @@ def plot_drainage_area_distribution(df):
     
     # Log scale histogram (only for positive values)
     if len(valid_sqmi) > 0:
-        ax2.hist(np.log10(valid_sqmi), bins=50, alpha=0.7, color='lightcoral', edgecolor='black')
-        ax2.set_xlabel('Log10(Drainage Area)')
+        # Log-spaced bins on a log axis instead of histogramming log10 of every value
+        lo, hi = float(valid_sqmi.min()), float(valid_sqmi.max())
+        edges = np.logspace(np.log10(lo), np.log10(hi), 51)
+        # Pin the outer edges so rounding in logspace never drops the extremes
+        edges[0], edges[-1] = lo, hi
+        plot_histogram(ax2, valid_sqmi, edges, alpha=0.7, color='lightcoral', edgecolor='black')
+        ax2.set_xscale('log')
+        ax2.set_xlabel('Drainage Area (sq mi)')
         ax2.set_ylabel('Number of Gages')
         ax2.set_title('Distribution of Drainage Areas (Log Scale)')
         ax2.grid(True, alpha=0.3)
@@ -129,18 +97,15 @@ def plot_drainage_area_distribution(df):
         ax2.set_title('Distribution of Drainage Areas (Log Scale)')
     
     plt.tight_layout()
-    plt.savefig('data/Outputs/drainage_area_distribution.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    plt.savefig('data/Outputs/drainage_area_distribution.png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
 
-def plot_quality_metrics(df):
+def plot_quality_metrics(df, valid_data, dpi=DPI):
     """Plot ABS_DIFF quality metrics"""
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
     
-    # Filter out zero values for meaningful analysis
-    valid_data = df[(df['sqmi'] > 0) & (df['abs_diff'] > 0)]
-    
     # Histogram of ABS_DIFF
-    ax1.hist(df['abs_diff'], bins=50, alpha=0.7, color='lightgreen', edgecolor='black')
+    plot_histogram(ax1, df['abs_diff'].values, 50, alpha=0.7, color='lightgreen', edgecolor='black')
     ax1.set_xlabel('ABS_DIFF')
     ax1.set_ylabel('Number of Gages')
     ax1.set_title(f'Distribution of ABS_DIFF Values\n(Total records: {len(df):,})')
@@ -148,7 +113,9 @@ def plot_quality_metrics(df):
     
     # Scatter plot: ABS_DIFF vs Drainage Area (only valid data)
     if len(valid_data) > 0:
-        scatter = ax2.scatter(valid_data['sqmi'], valid_data['abs_diff'], alpha=0.6, c=valid_data['center_lat'], cmap='coolwarm')
+        scatter = ax2.scatter(valid_data['sqmi'].values, valid_data['abs_diff'].values, alpha=0.6,
+                              c=valid_data['center_lat'].values, cmap='coolwarm')
+        scatter.set_rasterized(True)
         ax2.set_xlabel('Drainage Area (sq mi)')
         ax2.set_ylabel('ABS_DIFF')
         ax2.set_title(f'ABS_DIFF vs Drainage Area\n(Color = Latitude, Valid records: {len(valid_data):,})')
@@ -160,38 +127,52 @@ def plot_quality_metrics(df):
         ax2.set_title('ABS_DIFF vs Drainage Area')
     
     plt.tight_layout()
-    plt.savefig('data/Outputs/quality_metrics.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    plt.savefig('data/Outputs/quality_metrics.png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
 
-def plot_geographic_coverage(df):
+def plot_geographic_coverage(df, dpi=DPI):
     """Plot geographic coverage and density"""
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
     
     # Geographic extent
-    ax1.scatter(df['center_lon'], df['center_lat'], alpha=0.5, s=1, color='blue')
+    # Uniform size and color, so a single marker line is enough
+    ax1.plot(df['center_lon'].values, df['center_lat'].values, marker='.', linestyle='None',
+             markersize=1, color='blue', alpha=0.5, antialiased=False, rasterized=True)
     ax1.set_xlabel('Longitude')
     ax1.set_ylabel('Latitude')
     ax1.set_title('Geographic Coverage of USGS Gages')
     ax1.grid(True, alpha=0.3)
     
-    # Add bounding box
-    ax1.add_patch(plt.Rectangle((df['bbox_min_lon'].min(), df['bbox_min_lat'].min()),
-                               df['bbox_max_lon'].max() - df['bbox_min_lon'].min(),
-                               df['bbox_max_lat'].max() - df['bbox_min_lat'].min(),
+    # Add bounding box; the bbox extremes come from one reduction over all four columns
+    bb = df[['bbox_min_lon', 'bbox_min_lat', 'bbox_max_lon', 'bbox_max_lat']].values
+    mins = bb.min(axis=0)
+    maxs = bb.max(axis=0)
+    ax1.add_patch(plt.Rectangle((mins[0], mins[1]),
+                               maxs[2] - mins[0],
+                               maxs[3] - mins[1],
                                fill=False, color='red', linewidth=2, label='Total Coverage'))
     ax1.legend()
     
-    # Density plot
-    ax2.hexbin(df['center_lon'], df['center_lat'], gridsize=50, cmap='YlOrRd')
+    # Density plot; large point sets are counted on a fixed grid by datashader
+    if use_datashader(len(df)):
+        shade_points(ax2, df, 'center_lon', 'center_lat', width=100, height=50, cmap='YlOrRd')
+    else:
+        # Bin on a 50x50 grid in compiled code and draw it as one image;
+        # histogram2d rejects NaN, so skip gages without a center like hexbin did
+        lon, lat = df['center_lon'].values, df['center_lat'].values
+        located = np.isfinite(lon) & np.isfinite(lat)
+        counts, lon_edges, lat_edges = np.histogram2d(lon[located], lat[located], bins=50)
+        ax2.imshow(counts.T, origin='lower', extent=(lon_edges[0], lon_edges[-1], lat_edges[0], lat_edges[-1]),
+                   aspect='auto', cmap='YlOrRd')
     ax2.set_xlabel('Longitude')
     ax2.set_ylabel('Latitude')
     ax2.set_title('Gage Density Heatmap')
     
     plt.tight_layout()
-    plt.savefig('data/Outputs/geographic_coverage.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    plt.savefig('data/Outputs/geographic_coverage.png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
 
-def create_summary_dashboard(df):
+def create_summary_dashboard(df, stats, valid_sqmi_mask, valid_data, dpi=DPI):
     """Create a comprehensive summary dashboard"""
     fig = plt.figure(figsize=(16, 12))
     
@@ -200,8 +181,9 @@ def create_summary_dashboard(df):
     
     # 1. Gage locations (top row, spans 2 columns)
     ax1 = fig.add_subplot(gs[0, :2])
-    scatter = ax1.scatter(df['center_lon'], df['center_lat'], 
-                         c=df['sqmi'], s=20, alpha=0.6, cmap='viridis')
+    scatter = ax1.scatter(df['center_lon'].values, df['center_lat'].values, 
+                         c=df['sqmi'].values, s=20, alpha=0.6, cmap='viridis')
+    scatter.set_rasterized(True)
     ax1.set_xlabel('Longitude')
     ax1.set_ylabel('Latitude')
     ax1.set_title('Gage Locations (Color = Drainage Area)')
@@ -209,9 +191,9 @@ def create_summary_dashboard(df):
     
     # 2. Drainage area distribution (top right)
     ax2 = fig.add_subplot(gs[0, 2])
-    valid_sqmi = df[df['sqmi'] > 0]['sqmi']
+    valid_sqmi = df['sqmi'].values[valid_sqmi_mask]
     if len(valid_sqmi) > 0:
-        ax2.hist(valid_sqmi, bins=30, alpha=0.7, color='skyblue')
+        plot_histogram(ax2, valid_sqmi, 30, alpha=0.7, color='skyblue')
         ax2.set_xlabel('Drainage Area (sq mi)')
         ax2.set_ylabel('Count')
         ax2.set_title(f'Drainage Area Distribution\n(Valid: {len(valid_sqmi):,})')
@@ -222,16 +204,16 @@ def create_summary_dashboard(df):
     
     # 3. ABS_DIFF distribution (middle left)
     ax3 = fig.add_subplot(gs[1, 0])
-    ax3.hist(df['abs_diff'], bins=30, alpha=0.7, color='lightgreen')
+    plot_histogram(ax3, df['abs_diff'].values, 30, alpha=0.7, color='lightgreen')
     ax3.set_xlabel('ABS_DIFF')
     ax3.set_ylabel('Count')
     ax3.set_title('Quality Metric Distribution')
     
     # 4. ABS_DIFF vs Drainage Area (middle center)
     ax4 = fig.add_subplot(gs[1, 1])
-    valid_data = df[(df['sqmi'] > 0) & (df['abs_diff'] > 0)]
     if len(valid_data) > 0:
-        ax4.scatter(valid_data['sqmi'], valid_data['abs_diff'], alpha=0.5, s=10)
+        ax4.plot(valid_data['sqmi'].values, valid_data['abs_diff'].values, marker='o', linestyle='None',
+                 markersize=3, alpha=0.5, antialiased=False, rasterized=True)
         ax4.set_xlabel('Drainage Area (sq mi)')
         ax4.set_ylabel('ABS_DIFF')
         ax4.set_title(f'Quality vs Drainage Area\n(Valid: {len(valid_data):,})')
@@ -242,7 +224,7 @@ def create_summary_dashboard(df):
     
     # 5. Coordinate count distribution (middle right)
     ax5 = fig.add_subplot(gs[1, 2])
-    ax5.hist(df['coord_count'], bins=30, alpha=0.7, color='orange')
+    plot_histogram(ax5, df['coord_count'].values, 30, alpha=0.7, color='orange')
     ax5.set_xlabel('Coordinate Count')
     ax5.set_ylabel('Count')
     ax5.set_title('Watershed Complexity')
@@ -258,59 +240,95 @@ def create_summary_dashboard(df):
     Unique Site Numbers: {df['site_no'].nunique():,}
     
     Drainage Area (sq mi):
-      Min: {df['sqmi'].min():.2f}
-      Max: {df['sqmi'].max():.2f}
-      Mean: {df['sqmi'].mean():.2f}
-      Median: {df['sqmi'].median():.2f}
+      Min: {stats.at['min', 'sqmi']:.2f}
+      Max: {stats.at['max', 'sqmi']:.2f}
+      Mean: {stats.at['mean', 'sqmi']:.2f}
+      Median: {stats.at['50%', 'sqmi']:.2f}
     
     ABS_DIFF (Quality Metric):
-      Min: {df['abs_diff'].min():.6f}
-      Max: {df['abs_diff'].max():.6f}
-      Mean: {df['abs_diff'].mean():.6f}
-      Median: {df['abs_diff'].median():.6f}
+      Min: {stats.at['min', 'abs_diff']:.6f}
+      Max: {stats.at['max', 'abs_diff']:.6f}
+      Mean: {stats.at['mean', 'abs_diff']:.6f}
+      Median: {stats.at['50%', 'abs_diff']:.6f}
     
     Geographic Coverage:
-      Longitude: {df['center_lon'].min():.2f} to {df['center_lon'].max():.2f}
-      Latitude: {df['center_lat'].min():.2f} to {df['center_lat'].max():.2f}
+      Longitude: {stats.at['min', 'center_lon']:.2f} to {stats.at['max', 'center_lon']:.2f}
+      Latitude: {stats.at['min', 'center_lat']:.2f} to {stats.at['max', 'center_lat']:.2f}
     
     Watershed Complexity:
-      Avg Coordinates per Watershed: {df['coord_count'].mean():.0f}
-      Max Coordinates: {df['coord_count'].max():,}
+      Avg Coordinates per Watershed: {stats.at['mean', 'coord_count']:.0f}
+      Max Coordinates: {int(stats.at['max', 'coord_count']):,}
     """
     
     ax6.text(0.1, 0.5, summary_text, fontsize=12, verticalalignment='center',
              bbox=dict(boxstyle="round,pad=0.5", facecolor="lightgray", alpha=0.8))
     
     plt.suptitle('USGS Gage Data Analysis Dashboard', fontsize=16, y=0.98)
-    plt.savefig('data/Outputs/summary_dashboard.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    plt.savefig('data/Outputs/summary_dashboard.png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+
+def render_figure(plot, parquet_path, summary, dpi):
+    """
+    Render one figure in a worker process from the cached gage Parquet file
+
+    summary is the compute_summary() result from the parent process, so the
+    statistics are computed once per run rather than once per figure.
+    """
+    df = pd.read_parquet(parquet_path)
+    stats, valid_sqmi_mask, valid_both_mask = summary
+    args = {
+        plot_gage_locations: lambda: (df, stats),
+        plot_drainage_area_distribution: lambda: (df, valid_sqmi_mask),
+        plot_quality_metrics: lambda: (df, df[valid_both_mask]),
+        plot_geographic_coverage: lambda: (df,),
+        create_summary_dashboard: lambda: (df, stats, valid_sqmi_mask, df[valid_both_mask]),
+    }[plot]()
+    plot(*args, dpi=dpi)
+
+FIGURES = [
+    (plot_gage_locations, "Gage locations map"),
+    (plot_drainage_area_distribution, "Drainage area distribution"),
+    (plot_quality_metrics, "Quality metrics"),
+    (plot_geographic_coverage, "Geographic coverage"),
+    (create_summary_dashboard, "Summary dashboard"),
+]
 
 def main():
     """Main visualization function"""
+    parser = argparse.ArgumentParser(description='Plot USGS gage data from keptGages.mat')
+    parser.add_argument('--hires', action='store_true',
+                        help=f'Save figures at {HIRES_DPI} dpi instead of {DPI} dpi')
+    args = parser.parse_args()
+    dpi = HIRES_DPI if args.hires else DPI
+    
     print("Loading gage data...")
+    # Also writes the Parquet snapshot the workers read from
     df = load_gage_data()
     print(f"Loaded {len(df)} gage records")
+    if df.empty:
+        print("Error: No data available to plot")
+        return
+    parquet_path = Path(KEPT_GAGES_MAT).with_suffix('.parquet')
     
     # Create output directory
     Path("data/Outputs").mkdir(exist_ok=True)
     
-    print("\nCreating visualizations...")
-    
-    # Individual plots
-    print("1. Gage locations map...")
-    plot_gage_locations(df)
-    
-    print("2. Drainage area distribution...")
-    plot_drainage_area_distribution(df)
-    
-    print("3. Quality metrics...")
-    plot_quality_metrics(df)
-    
-    print("4. Geographic coverage...")
-    plot_geographic_coverage(df)
-    
-    print("5. Summary dashboard...")
-    create_summary_dashboard(df)
+    # Statistics and masks shared by the plots, computed once and sent to
+    # every worker (a small table plus two boolean arrays)
+    summary = compute_summary(df)
+    
+    # The figures are independent, so render them in parallel; each worker
+    # reads the Parquet file instead of receiving a pickled DataFrame
+    workers = min(len(FIGURES), os.cpu_count() or 1)
+    print(f"\nCreating visualizations with {workers} worker processes...")
+    # Spawn rather than fork: extracting the .mat starts numba's thread pool
+    # in this process, and forking after that leaves the workers deadlocked
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(render_figure, plot, parquet_path, summary, dpi): label
+                   for plot, label in FIGURES}
+        for future in as_completed(futures):
+            future.result()
+            print(f"- {futures[future]} done")
     
     print("\nAll visualizations saved to data/Outputs/")
     print("Files created:")